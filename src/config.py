@@ -26,12 +26,20 @@ class Settings(BaseSettings):
         default="gemma3:4b",
         description="使用的 LLM 模型名稱"
     )
+    ollama_keep_alive: str = Field(
+        default="60m",
+        description="模型（含 KV 快取）在記憶體中保留的時間"
+    )
     
     # 資料庫設定
     database_path: str = Field(
         default="./data/demo.db",
         description="SQLite 資料庫路徑"
     )
+    db_pool_size: int = Field(
+        default=4,
+        description="資料庫連線池的連線數上限"
+    )
     
     # API 設定
     api_base_url: str = Field(
@@ -39,6 +47,16 @@ class Settings(BaseSettings):
         description="外部 API 基礎 URL"
     )
     
+    # 快取設定
+    query_cache_ttl: float = Field(
+        default=30.0,
+        description="資料庫查詢結果快取秒數（0 表示停用）"
+    )
+    enable_summary_cache: bool = Field(
+        default=True,
+        description="是否快取相同 prompt 的 AI 摘要結果"
+    )
+
     # 安全性設定
     enable_data_masking: bool = Field(
         default=True,
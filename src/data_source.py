@@ -4,35 +4,131 @@ MCP AI Summary Demo - 資料來源模組
 提供從資料庫和 API 取得 JSON 資料的功能
 """
 
+import asyncio
 import json
 import logging
+import time
 import aiosqlite
 import httpx
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncIterator
 
 from .config import settings
+from .http_client import shared_client
 from .security import data_masker
 
+# ijson 是選用的加速套件（pip install .[perf]）：
+# 增量解析大型 JSON 回應，不必先將整個內容載入記憶體
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 logger = logging.getLogger(__name__)
 
 
+class _AsyncByteReader:
+    """將 httpx 的位元組串流包成 ijson 可讀的非同步檔案介面"""
+
+    def __init__(self, aiter: AsyncIterator[bytes]):
+        self._aiter = aiter
+
+    async def read(self, size: int = -1) -> bytes:
+        try:
+            return await self._aiter.__anext__()
+        except StopAsyncIteration:
+            return b""
+
+# 允許查詢的資料表白名單（表名會直接插入 SQL，不可來自未驗證的輸入）
+_ALLOWED_TABLES = frozenset({"employees", "projects"})
+
+# 結果筆數超過此門檻時，遮罩改到工作執行緒執行以免阻塞事件迴圈
+# （re 在 C 層級比對時會釋放 GIL，多筆遮罩可與其他 I/O 並行）
+_MASK_OFFLOAD_THRESHOLD = 200
+
+
 class DataSourceManager:
     """資料來源管理器
-    
+
     統一管理從不同來源（資料庫、API）取得資料的邏輯
     """
-    
+
     def __init__(self):
         self.db_path = Path(settings.database_path)
         self.api_base_url = settings.api_base_url
-    
+        # 資料庫連線池：WAL 模式允許多條連線並行讀取，
+        # 併發的工具呼叫不必在單一連線上排隊
+        self._connections: list[aiosqlite.Connection] = []
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._pool_size = 0
+        self._db_lock = asyncio.Lock()
+        # 查詢結果快取：key -> (到期時間, 遮罩後的結果)
+        self._query_cache: dict[tuple, tuple[float, list[dict[str, Any]]]] = {}
+        # 進行中的相同查詢：併發的重複呼叫共用同一個 Future
+        self._inflight: dict[tuple, asyncio.Future] = {}
+        # 組好的 SQL 語句快取：相同形狀的查詢重用同一條語句，
+        # SQLite 也能重用解析結果
+        self._stmt_cache: dict[tuple, str] = {}
+        # HTTP 驗證快取：key -> (ETag, 遮罩後的資料)，搭配 If-None-Match
+        self._etag_cache: dict[tuple, tuple[str, Any]] = {}
+        # 單筆資源查詢的批次合併器
+        self.api_batcher = APIBatcher(self)
+
+    async def _open_connection(self) -> aiosqlite.Connection:
+        """開啟並設定一條新的資料庫連線
+
+        每次查詢都重新 connect 會付出執行緒啟動與檔案開啟成本，
+        因此連線由連線池保留重用，開啟時套用效能相關 PRAGMA。
+        """
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        db = await aiosqlite.connect(self.db_path)
+
+        # WAL 允許讀寫並行，其餘 PRAGMA 減少 fsync 與暫存 I/O
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA synchronous=NORMAL")
+        await db.execute("PRAGMA temp_store=MEMORY")
+        await db.execute("PRAGMA cache_size=-64000")
+        await db.execute("PRAGMA busy_timeout=5000")
+
+        db.row_factory = aiosqlite.Row
+        return db
+
+    @asynccontextmanager
+    async def _acquire(self):
+        """從連線池取出一條連線，用畢歸還
+
+        連線依需求延遲建立，數量以 settings.db_pool_size 為上限；
+        連線池耗盡時等待其他呼叫歸還。
+        """
+        try:
+            db = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            db = None
+            async with self._db_lock:
+                if self._pool_size < settings.db_pool_size:
+                    self._pool_size += 1
+                    db = await self._open_connection()
+                    self._connections.append(db)
+            if db is None:
+                db = await self._idle.get()
+
+        try:
+            yield db
+        finally:
+            self._idle.put_nowait(db)
+
+    async def close(self) -> None:
+        """關閉連線池中的所有資料庫連線"""
+        for db in self._connections:
+            await db.close()
+        self._connections.clear()
+        self._idle = asyncio.Queue()
+        self._pool_size = 0
+
     async def init_database(self) -> None:
         """初始化資料庫並建立範例資料表"""
-        # 確保資料目錄存在
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._acquire() as db:
             # 建立員工資料表（範例）
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS employees (
@@ -46,7 +142,7 @@ class DataSourceManager:
                     phone TEXT
                 )
             """)
-            
+
             # 建立專案資料表（範例）
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS projects (
@@ -61,19 +157,23 @@ class DataSourceManager:
                     FOREIGN KEY (manager_id) REFERENCES employees(id)
                 )
             """)
-            
+
             # 檢查是否需要插入範例資料
             cursor = await db.execute("SELECT COUNT(*) FROM employees")
             count = (await cursor.fetchone())[0]
-            
+
             if count == 0:
                 await self._insert_sample_data(db)
-            
+
             await db.commit()
             logger.info(f"資料庫初始化完成: {self.db_path}")
     
     async def _insert_sample_data(self, db: aiosqlite.Connection) -> None:
-        """插入範例資料"""
+        """插入範例資料
+
+        批次寫入包在單一交易中，避免 SQLite 對每條 INSERT 各做一次
+        fsync；種子資料期間暫時關閉 synchronous，結束後恢復 NORMAL。
+        """
         employees = [
             ("張小明", "zhang@company.com", "研發部", "資深工程師", 85000, "2020-03-15", "0912-345-678"),
             ("李美華", "li@company.com", "人資部", "經理", 95000, "2018-07-01", "0923-456-789"),
@@ -82,64 +182,147 @@ class DataSourceManager:
             ("林志豪", "lin@company.com", "研發部", "技術主管", 120000, "2017-05-08", "0956-789-012"),
         ]
         
-        await db.executemany(
-            "INSERT INTO employees (name, email, department, position, salary, hire_date, phone) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            employees
-        )
-        
         projects = [
             ("智慧倉儲系統", "建立自動化倉儲管理平台", "進行中", "2024-01-15", "2024-12-31", 2000000, 5),
             ("客戶關係管理升級", "升級現有CRM系統至雲端版本", "已完成", "2023-06-01", "2024-03-30", 800000, 2),
             ("行動應用程式開發", "開發企業內部行動辦公App", "規劃中", "2025-01-01", "2025-06-30", 1500000, 1),
         ]
         
-        await db.executemany(
-            "INSERT INTO projects (name, description, status, start_date, end_date, budget, manager_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            projects
-        )
-        
+        await db.execute("PRAGMA synchronous=OFF")
+        try:
+            await db.execute("BEGIN")
+            await db.executemany(
+                "INSERT INTO employees (name, email, department, position, salary, hire_date, phone) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                employees
+            )
+            await db.executemany(
+                "INSERT INTO projects (name, description, status, start_date, end_date, budget, manager_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                projects
+            )
+            await db.commit()
+        finally:
+            await db.execute("PRAGMA synchronous=NORMAL")
+
         logger.info("範例資料插入完成")
     
     async def query_database(
-        self, 
-        table: str, 
+        self,
+        table: str,
         conditions: dict[str, Any] | None = None,
         limit: int = 100
     ) -> list[dict[str, Any]]:
         """從資料庫查詢資料
-        
+
+        相同的 (table, conditions, limit) 查詢結果會快取一小段時間
+        （settings.query_cache_ttl），且併發的重複查詢只會實際執行一次。
+
         Args:
             table: 資料表名稱
-            conditions: 查詢條件 (欄位名稱: 值)
+            conditions: 查詢條件 (欄位名稱: 值)；值為列表時展開為 IN 查詢，
+                多個候選值只需一次資料庫往返
             limit: 最大回傳筆數
-            
+
         Returns:
             查詢結果列表（已遮罩敏感資料）
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            
-            # 建構查詢語句
+        ttl = settings.query_cache_ttl
+        if ttl <= 0:
+            return await self._execute_query(table, conditions, limit)
+
+        key = (
+            table,
+            frozenset(
+                (k, tuple(v) if isinstance(v, list) else v)
+                for k, v in (conditions or {}).items()
+            ),
+            limit
+        )
+
+        cached = self._query_cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        # 相同查詢已在進行中：直接等待其結果，避免重複的 SQL 與遮罩成本
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            results = await self._execute_query(table, conditions, limit)
+        except BaseException as e:
+            future.set_exception(e)
+            if not future.cancelled():
+                future.exception()  # 沒有其他等待者時避免「未取回例外」警告
+            raise
+        else:
+            future.set_result(results)
+            if len(self._query_cache) >= 128:
+                self._query_cache.pop(next(iter(self._query_cache)))
+            self._query_cache[key] = (time.monotonic() + ttl, results)
+            return results
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _execute_query(
+        self,
+        table: str,
+        conditions: dict[str, Any] | None = None,
+        limit: int = 100
+    ) -> list[dict[str, Any]]:
+        """實際執行資料庫查詢（不經過快取）"""
+        if table not in _ALLOWED_TABLES:
+            raise ValueError(f"不允許查詢的資料表: {table}")
+
+        # 相同形狀（資料表 + 條件欄位 + 筆數上限）的查詢重用快取的 SQL，
+        # 條件值一律走參數繫結；列表值展開為 IN (?, ...)，
+        # 語句形狀因此包含每個欄位的值數量
+        cond_keys = tuple(sorted(conditions)) if conditions else ()
+        shape = tuple(
+            (key, len(conditions[key]))
+            if isinstance(conditions[key], (list, tuple)) else (key, None)
+            for key in cond_keys
+        )
+        stmt_key = (table, shape, limit)
+
+        query = self._stmt_cache.get(stmt_key)
+        if query is None:
+            for key in cond_keys:
+                if not key.isidentifier():
+                    raise ValueError(f"無效的查詢條件欄位: {key}")
             query = f"SELECT * FROM {table}"
-            params = []
-            
-            if conditions:
-                where_clauses = []
-                for key, value in conditions.items():
-                    where_clauses.append(f"{key} = ?")
-                    params.append(value)
-                query += " WHERE " + " AND ".join(where_clauses)
-            
+            if cond_keys:
+                clauses = []
+                for key, arity in shape:
+                    if arity is None:
+                        clauses.append(f"{key} = ?")
+                    else:
+                        clauses.append(f"{key} IN ({', '.join('?' * arity)})")
+                query += " WHERE " + " AND ".join(clauses)
             query += f" LIMIT {limit}"
-            
+            self._stmt_cache[stmt_key] = query
+
+        params: list[Any] = []
+        for key in cond_keys:
+            value = conditions[key]
+            if isinstance(value, (list, tuple)):
+                params.extend(value)
+            else:
+                params.append(value)
+
+        async with self._acquire() as db:
             cursor = await db.execute(query, params)
             rows = await cursor.fetchall()
-            
-            # 轉換為字典列表
-            results = [dict(row) for row in rows]
-            
-            # 套用資料遮罩
-            return data_masker.mask_list(results)
+
+        # 轉換為字典列表
+        results = [dict(row) for row in rows]
+
+        # 套用資料遮罩：結果列欄位相同，逐欄掃描比逐列走訪便宜
+        # （大型結果集移到工作執行緒）
+        if len(results) > _MASK_OFFLOAD_THRESHOLD:
+            return await asyncio.to_thread(data_masker.mask_columns, results)
+        return data_masker.mask_columns(results)
     
     async def fetch_from_api(
         self, 
@@ -156,24 +339,113 @@ class DataSourceManager:
             API 回應資料（已遮罩敏感資料）
         """
         url = f"{self.api_base_url}/{endpoint.lstrip('/')}"
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, params=params, timeout=30.0)
+
+        # 帶上前次回應的 ETag 做條件式請求：內容未變時伺服器回 304，
+        # 完全省下本文傳輸與解析／遮罩成本
+        cache_key = (url, tuple(sorted(params.items())) if params else ())
+        cached = self._etag_cache.get(cache_key)
+        headers = {"If-None-Match": cached[0]} if cached is not None else None
+
+        try:
+            response = await shared_client.get(
+                url, params=params, headers=headers, timeout=30.0
+            )
+            if response.status_code == 304 and cached is not None:
+                return cached[1]
+            response.raise_for_status()
+            data = response.json()
+
+            # 套用資料遮罩（大型結果集移到工作執行緒）
+            if isinstance(data, list):
+                if len(data) > _MASK_OFFLOAD_THRESHOLD:
+                    data = await asyncio.to_thread(data_masker.mask_list, data)
+                else:
+                    data = data_masker.mask_list(data)
+            elif isinstance(data, dict):
+                data = data_masker.mask_dict(data)
+
+            etag = response.headers.get("etag")
+            if etag:
+                if len(self._etag_cache) >= 64:
+                    self._etag_cache.pop(next(iter(self._etag_cache)))
+                self._etag_cache[cache_key] = (etag, data)
+
+            return data
+
+        except httpx.HTTPError as e:
+            logger.error(f"API 請求失敗: {e}")
+            raise
+
+    async def fetch_from_api_raw(
+        self,
+        endpoint: str,
+        params: dict[str, Any] | None = None
+    ) -> str:
+        """取得 API 回應的原始 JSON 字串（不解析、不遮罩）
+
+        呼叫端只是把回應原樣轉交時，解碼再重新編碼純屬浪費。
+        注意：此路徑完全跳過資料遮罩，僅能在
+        settings.enable_data_masking 關閉時使用。
+
+        Args:
+            endpoint: API 端點路徑
+            params: 查詢參數
+
+        Returns:
+            伺服器回應的原始字串
+        """
+        url = f"{self.api_base_url}/{endpoint.lstrip('/')}"
+        try:
+            response = await shared_client.get(url, params=params, timeout=30.0)
+            response.raise_for_status()
+            return response.text
+        except httpx.HTTPError as e:
+            logger.error(f"API 請求失敗: {e}")
+            raise
+
+    async def fetch_from_api_stream(
+        self,
+        endpoint: str,
+        params: dict[str, Any] | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """以串流方式從外部 API 取得列表資料
+
+        安裝 ijson 時邊下載邊增量解析，逐筆遮罩後立即產出，
+        記憶體用量不隨回應大小成長，第一筆資料的延遲也只剩
+        「看到第一個 JSON 物件」而非「下載並解析完整回應」。
+        未安裝時退回 fetch_from_api 的一次性下載。
+
+        Args:
+            endpoint: API 端點路徑（需回傳 JSON 陣列）
+            params: 查詢參數
+
+        Yields:
+            遮罩後的單筆資料
+        """
+        if ijson is None:
+            data = await self.fetch_from_api(endpoint, params)
+            for item in (data if isinstance(data, list) else [data]):
+                yield item
+            return
+
+        url = f"{self.api_base_url}/{endpoint.lstrip('/')}"
+
+        try:
+            async with shared_client.stream(
+                "GET", url, params=params, timeout=30.0
+            ) as response:
                 response.raise_for_status()
-                data = response.json()
-                
-                # 套用資料遮罩
-                if isinstance(data, list):
-                    return data_masker.mask_list(data)
-                elif isinstance(data, dict):
-                    return data_masker.mask_dict(data)
-                return data
-                
-            except httpx.HTTPError as e:
-                logger.error(f"API 請求失敗: {e}")
-                raise
-    
+                reader = _AsyncByteReader(response.aiter_bytes())
+                async for item in ijson.items(reader, "item"):
+                    if isinstance(item, dict):
+                        yield data_masker.mask_dict(item)
+                    else:
+                        yield item
+
+        except httpx.HTTPError as e:
+            logger.error(f"API 請求失敗: {e}")
+            raise
+
     async def get_table_schema(self, table: str) -> list[dict[str, str]]:
         """取得資料表結構
         
@@ -183,19 +455,92 @@ class DataSourceManager:
         Returns:
             欄位資訊列表
         """
-        async with aiosqlite.connect(self.db_path) as db:
+        if table not in _ALLOWED_TABLES:
+            raise ValueError(f"不允許查詢的資料表: {table}")
+
+        async with self._acquire() as db:
             cursor = await db.execute(f"PRAGMA table_info({table})")
             columns = await cursor.fetchall()
-            
-            return [
-                {
-                    "name": col[1],
-                    "type": col[2],
-                    "nullable": not col[3],
-                    "primary_key": bool(col[5])
-                }
-                for col in columns
-            ]
+
+        return [
+            {
+                "name": col[1],
+                "type": col[2],
+                "nullable": not col[3],
+                "primary_key": bool(col[5])
+            }
+            for col in columns
+        ]
+
+
+class APIBatcher:
+    """API 單筆查詢合併器
+
+    將極短時間內對同一資源的多筆單筆查詢（如 users/1、users/2）
+    收集成一個批次，等待收集窗口後一次並行送出；
+    相同 ID 的併發查詢共用同一個結果。
+    """
+
+    def __init__(self, manager: DataSourceManager, window: float = 0.05):
+        """初始化合併器
+
+        Args:
+            manager: 資料來源管理器（實際送出 HTTP 請求）
+            window: 收集窗口秒數
+        """
+        self._manager = manager
+        self._window = window
+        # 資源類型 -> {資源 ID: 等待結果的 Future}
+        self._buf: dict[str, dict[Any, asyncio.Future]] = {}
+
+    async def load(self, resource_type: str, item_id: Any) -> Any:
+        """查詢單筆資源，與同一窗口內的其他查詢合併送出
+
+        Args:
+            resource_type: 資源類型，例如 "users"、"posts"
+            item_id: 資源 ID
+
+        Returns:
+            遮罩後的單筆資料
+        """
+        pending = self._buf.get(resource_type)
+        if pending is None:
+            pending = {}
+            self._buf[resource_type] = pending
+            # 第一筆進來時排程沖洗，讓同窗口的查詢有時間進到緩衝區
+            asyncio.get_running_loop().create_task(self._flush_soon(resource_type))
+
+        future = pending.get(item_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            pending[item_id] = future
+
+        return await asyncio.shield(future)
+
+    async def _flush_soon(self, resource_type: str) -> None:
+        """等待收集窗口後送出整批查詢並回填結果"""
+        await asyncio.sleep(self._window)
+        pending = self._buf.pop(resource_type, {})
+        if not pending:
+            return
+
+        # JSONPlaceholder 類 API 沒有 ids= 的批次端點，
+        # 改以共用 keep-alive 連線一次並行送出個別請求
+        results = await asyncio.gather(
+            *(
+                self._manager.fetch_from_api(f"{resource_type}/{item_id}")
+                for item_id in pending
+            ),
+            return_exceptions=True
+        )
+
+        for future, result in zip(pending.values(), results):
+            if future.cancelled():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
 
 
 # 全域資料來源管理器
@@ -0,0 +1,28 @@
+"""
+MCP AI Summary Demo - 共用 HTTP 客戶端
+=======================================
+提供整個應用程式共用的 httpx.AsyncClient，
+透過 keep-alive 連線池與 HTTP/2 避免每次請求重新握手
+"""
+
+import httpx
+
+# 共用的 AsyncClient：
+# - keep-alive 連線池省去每次請求的 TCP/TLS 握手
+# - HTTP/2 允許同一連線上多工處理並行請求
+shared_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_keepalive_connections=20,
+        max_connections=100,
+        # 工具呼叫間常有數十秒空檔，預設 5 秒的閒置逾時
+        # 會讓連線在兩次呼叫之間被收回、下次又得重新握手
+        keepalive_expiry=60.0
+    )
+)
+
+
+async def close_shared_client() -> None:
+    """關閉共用的 HTTP 客戶端（應用程式結束時呼叫）"""
+    if not shared_client.is_closed:
+        await shared_client.aclose()
@@ -0,0 +1,43 @@
+"""
+MCP AI Summary Demo - JSON 序列化工具
+======================================
+統一的 JSON 編解碼入口：安裝 orjson（pip install .[perf]）時
+使用 C 實作的編解碼器，未安裝時退回標準函式庫
+
+dumps 預設輸出緊湊格式：餵給 LLM 或 MCP 客戶端的字串不需要縮排，
+省下序列化時插入空白的成本，也減少 LLM 要處理的 token 數。
+需要人類閱讀時改用 dumps_pretty。
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> str:
+        """序列化為緊湊的 JSON 字串"""
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def dumps_pretty(obj: Any) -> str:
+        """序列化為格式化（縮排 2 格）的 JSON 字串"""
+        return orjson.dumps(
+            obj,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        ).decode()
+
+    loads = orjson.loads
+else:
+    def dumps(obj: Any) -> str:
+        """序列化為緊湊的 JSON 字串"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps_pretty(obj: Any) -> str:
+        """序列化為格式化（縮排 2 格）的 JSON 字串"""
+        return json.dumps(obj, ensure_ascii=False, indent=2)
+
+    loads = json.loads
@@ -4,68 +4,105 @@ MCP AI Summary Demo - Ollama 整合模組
 提供與本地 Ollama 服務的整合功能
 """
 
+import hashlib
 import logging
+import time
 import httpx
+from collections import OrderedDict
 from typing import AsyncGenerator
 
 from .config import settings
+from .http_client import shared_client
+from .jsonutil import loads as _json_loads
 
 logger = logging.getLogger(__name__)
 
+# 健康檢查結果的快取秒數：工具常在同一輪對話內重複檢查
+_HEALTH_CACHE_TTL = 5.0
+
+# 摘要結果快取的最大筆數
+_SUMMARY_CACHE_SIZE = 256
+
+# msgspec 是選用的加速套件（pip install .[perf]）：
+# 以 C 實作的解碼器解析串流的 NDJSON 片段，缺少時退回 jsonutil 的解析器
+try:
+    import msgspec
+
+    class _StreamChunk(msgspec.Struct):
+        """Ollama 串流回應的單行片段（只解碼需要的欄位）"""
+        response: str = ""
+        done: bool = False
+
+    _chunk_decoder = msgspec.json.Decoder(_StreamChunk)
+except ImportError:
+    msgspec = None
+    _chunk_decoder = None
+
 
 class OllamaClient:
     """Ollama API 客戶端
-    
+
     用於與本地執行的 Ollama 服務通訊，
     支援文字生成和串流回應
     """
-    
+
     def __init__(
         self,
         base_url: str | None = None,
-        model: str | None = None
+        model: str | None = None,
+        client: httpx.AsyncClient | None = None
     ):
         """初始化 Ollama 客戶端
-        
+
         Args:
             base_url: Ollama API 基礎 URL
             model: 使用的模型名稱
+            client: httpx 客戶端（預設使用共用的 keep-alive 客戶端）
         """
         self.base_url = base_url or settings.ollama_base_url
         self.model = model or settings.ollama_model
-    
+        self.client = client or shared_client
+        self._health_cache: tuple[float, bool] | None = None
+
     async def check_health(self) -> bool:
         """檢查 Ollama 服務是否可用
-        
+
+        結果會快取數秒，避免連續的工具呼叫重複打 /api/tags。
+
         Returns:
             服務是否正常運作
         """
+        now = time.monotonic()
+        if self._health_cache is not None and now - self._health_cache[0] < _HEALTH_CACHE_TTL:
+            return self._health_cache[1]
+
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=5.0
-                )
-                return response.status_code == 200
+            response = await self.client.get(
+                f"{self.base_url}/api/tags",
+                timeout=5.0
+            )
+            healthy = response.status_code == 200
         except Exception as e:
             logger.error(f"Ollama 健康檢查失敗: {e}")
-            return False
-    
+            healthy = False
+
+        self._health_cache = (now, healthy)
+        return healthy
+
     async def list_models(self) -> list[str]:
         """列出可用的模型
-        
+
         Returns:
             模型名稱列表
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                data = response.json()
-                return [model["name"] for model in data.get("models", [])]
+            response = await self.client.get(
+                f"{self.base_url}/api/tags",
+                timeout=10.0
+            )
+            response.raise_for_status()
+            data = response.json()
+            return [model["name"] for model in data.get("models", [])]
         except Exception as e:
             logger.error(f"取得模型列表失敗: {e}")
             return []
@@ -92,6 +129,7 @@ class OllamaClient:
             "model": self.model,
             "prompt": prompt,
             "stream": False,
+            "keep_alive": settings.ollama_keep_alive,
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens
@@ -102,15 +140,14 @@ class OllamaClient:
             payload["system"] = system
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json=payload,
-                    timeout=120.0  # LLM 生成可能需要較長時間
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data.get("response", "")
+            response = await self.client.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                timeout=120.0  # LLM 生成可能需要較長時間
+            )
+            response.raise_for_status()
+            data = response.json()
+            return data.get("response", "")
         except httpx.TimeoutException:
             logger.error("Ollama 請求逾時")
             raise RuntimeError("AI 生成請求逾時，請稍後再試")
@@ -140,6 +177,7 @@ class OllamaClient:
             "model": self.model,
             "prompt": prompt,
             "stream": True,
+            "keep_alive": settings.ollama_keep_alive,
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens
@@ -150,22 +188,33 @@ class OllamaClient:
             payload["system"] = system
         
         try:
-            async with httpx.AsyncClient() as client:
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/api/generate",
-                    json=payload,
-                    timeout=120.0
-                ) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if line:
-                            import json
-                            data = json.loads(line)
+            async with self.client.stream(
+                "POST",
+                f"{self.base_url}/api/generate",
+                json=payload,
+                timeout=120.0
+            ) as response:
+                response.raise_for_status()
+
+                # 以位元組緩衝自行切行，避免 aiter_lines 的逐行解碼開銷
+                buffer = b""
+                async for chunk in response.aiter_bytes():
+                    buffer += chunk
+                    while (newline := buffer.find(b"\n")) != -1:
+                        line, buffer = buffer[:newline], buffer[newline + 1:]
+                        if not line:
+                            continue
+                        if _chunk_decoder is not None:
+                            data = _chunk_decoder.decode(line)
+                            yield data.response
+                            if data.done:
+                                return
+                        else:
+                            data = _json_loads(line)
                             if "response" in data:
                                 yield data["response"]
                             if data.get("done", False):
-                                break
+                                return
         except Exception as e:
             logger.error(f"串流生成錯誤: {e}")
             raise
@@ -184,7 +233,11 @@ class SummaryGenerator:
             ollama_client: Ollama 客戶端實例
         """
         self.client = ollama_client or OllamaClient()
-        
+
+        # 摘要結果的 LRU 快取：prompt 雜湊 -> 摘要
+        # LLM 往返動輒數秒，相同模板加相同資料的重複請求直接回傳快取
+        self._cache: OrderedDict[bytes, str] = OrderedDict()
+
         # 系統提示，定義 AI 的角色和行為
         self.system_prompt = """你是一個專業的商業分析助理。你的任務是：
 1. 根據提供的資料生成清晰、結構化的中文摘要
@@ -194,25 +247,57 @@ class SummaryGenerator:
 5. 如果資料不足，誠實說明而不是猜測
 6. 使用繁體中文回應"""
     
+    async def _collect_stream(self, prompt: str, temperature: float) -> str:
+        """消費串流回應並組合成完整摘要
+
+        以 stream=True 逐片段接收，第一個 token 產生後就開始傳輸，
+        不必等 Ollama 端緩衝完整段回應；片段先收進列表、
+        最後一次 join，避免重複字串串接的 O(n²) 成本。
+        """
+        chunks: list[str] = []
+        async for chunk in self.client.generate_stream(
+            prompt=prompt,
+            system=self.system_prompt,
+            temperature=temperature
+        ):
+            chunks.append(chunk)
+        return "".join(chunks)
+
     async def generate_summary(
         self,
         prompt: str,
         temperature: float = 0.5
     ) -> str:
         """生成摘要
-        
+
+        相同 prompt（與溫度）的重複請求會直接回傳快取結果，
+        可透過 settings.enable_summary_cache 關閉。
+
         Args:
             prompt: 完整的 prompt（已包含資料）
             temperature: 生成溫度（摘要任務建議使用較低溫度）
-            
+
         Returns:
             生成的摘要文字
         """
-        return await self.client.generate(
-            prompt=prompt,
-            system=self.system_prompt,
-            temperature=temperature
-        )
+        if not settings.enable_summary_cache:
+            return await self._collect_stream(prompt, temperature)
+
+        key = hashlib.blake2b(
+            f"{temperature}:{prompt}".encode(), digest_size=16
+        ).digest()
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        summary = await self._collect_stream(prompt, temperature)
+
+        self._cache[key] = summary
+        if len(self._cache) > _SUMMARY_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return summary
     
     async def generate_summary_stream(
         self,
@@ -5,46 +5,78 @@ MCP AI Summary Demo - Prompt 模板系統
 """
 
 import re
-import json
 from typing import Any
 from dataclasses import dataclass, field
 
+from .jsonutil import dumps as _dump_json
 
-@dataclass
+# {{variable}} 格式的佔位符
+_PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+
+
+class _KeepMissing(dict):
+    """format_map 用的變數字典：未提供的變數保留原始 {{var}} 佔位符"""
+
+    def __missing__(self, key: str) -> str:
+        return "{{" + key + "}}"
+
+
+def _compile_format(template: str) -> str:
+    """將 {{var}} 模板預編譯為 str.format 相容的格式字串
+
+    一般文字中的大括號會先跳脫，佔位符則轉為 {var}，
+    讓渲染只需一次 C 層級的 format 掃描。
+    """
+    parts: list[str] = []
+    pos = 0
+    for match in _PLACEHOLDER.finditer(template):
+        literal = template[pos:match.start()]
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        parts.append("{" + match.group(1) + "}")
+        pos = match.end()
+    parts.append(template[pos:].replace("{", "{{").replace("}", "}}"))
+    return "".join(parts)
+
+
+@dataclass(slots=True)
 class PromptTemplate:
     """Prompt 模板類別
-    
-    支援使用 {{variable}} 語法的佔位符
+
+    支援使用 {{variable}} 語法的佔位符。
+    使用 __slots__ 省去每個實例的 __dict__，屬性存取也更快。
     """
     name: str
     description: str
     template: str
     variables: list[str] = field(default_factory=list)
-    
+    _fmt: str = field(init=False, repr=False, default="")
+    _varset: frozenset[str] = field(init=False, repr=False, default=frozenset())
+
     def __post_init__(self):
-        """自動解析模板中的變數"""
+        """自動解析模板中的變數並預編譯格式字串"""
         if not self.variables:
             # 使用正則表達式找出所有 {{variable}} 格式的佔位符
-            pattern = r"\{\{(\w+)\}\}"
-            self.variables = list(set(re.findall(pattern, self.template)))
-    
+            self.variables = list(set(_PLACEHOLDER.findall(self.template)))
+        self._fmt = _compile_format(self.template)
+        self._varset = frozenset(self.variables)
+
     def render(self, **kwargs) -> str:
         """使用提供的變數值渲染模板
-        
+
         Args:
             **kwargs: 變數名稱與值的對應
-            
+
         Returns:
             渲染後的 prompt 字串
         """
-        result = self.template
+        values = _KeepMissing()
         for var_name, value in kwargs.items():
             # 如果值是字典或列表，轉換為格式化的 JSON 字串
             if isinstance(value, (dict, list)):
-                value = json.dumps(value, ensure_ascii=False, indent=2)
-            placeholder = f"{{{{{var_name}}}}}"
-            result = result.replace(placeholder, str(value))
-        return result
+                value = _dump_json(value)
+            values[var_name] = str(value)
+        # 預編譯的格式字串只需掃描模板一次，而非每個變數各掃一次
+        return self._fmt.format_map(values)
     
     def validate(self, **kwargs) -> tuple[bool, list[str]]:
         """驗證是否提供了所有必要的變數
@@ -55,8 +87,11 @@ class PromptTemplate:
         Returns:
             (是否驗證通過, 缺少的變數列表)
         """
+        # 常見情況（變數齊全）只需一次 C 層級的集合比較
+        if self._varset <= kwargs.keys():
+            return True, []
         missing = [var for var in self.variables if var not in kwargs]
-        return len(missing) == 0, missing
+        return False, missing
 
 
 class PromptLibrary:
@@ -116,22 +151,25 @@ class PromptLibrary:
         ))
         
         # 專案狀態報告模板
+        # 靜態指示放在最前面、動態內容（資料、日期）放在後面：
+        # Ollama 的 KV 快取以位元組為單位比對前綴，
+        # 前綴保持不變才能在重複請求間重用已算好的 prefill
         self.register(PromptTemplate(
             name="project_status",
             description="生成專案狀態彙總報告",
             template="""請根據以下專案資料生成專案狀態報告。
 
-## 專案清單
-```json
-{{projects}}
-```
-
 ## 報告要求
 1. 按專案狀態分類（進行中、已完成、規劃中）
 2. 計算總預算與各專案預算佔比
 3. 識別時程風險（接近或超過截止日期）
 4. 提供專案管理建議
 
+## 專案清單
+```json
+{{projects}}
+```
+
 當前日期：{{current_date}}
 
 請生成專案狀態報告："""
@@ -6,7 +6,8 @@ MCP AI Summary Demo - 資料遮罩模組
 """
 
 import re
-from typing import Any
+from collections import deque
+from typing import Any, Callable
 from .config import settings
 
 
@@ -23,16 +24,39 @@ class DataMasker:
         Args:
             masked_fields: 需要遮罩的欄位名稱列表
         """
-        self.masked_fields = masked_fields or settings.masked_fields_list
+        self.masked_fields = frozenset(masked_fields or settings.masked_fields_list)
         self.enabled = settings.enable_data_masking
-        
-        # 預定義的正則表達式模式
-        self.patterns = {
-            "email": (r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}", self._mask_email),
-            "phone": (r"\d{2,4}[-\s]?\d{3,4}[-\s]?\d{3,4}", self._mask_phone),
-            "credit_card": (r"\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4}", self._mask_credit_card),
-            "ssn": (r"\d{3}[-\s]?\d{2}[-\s]?\d{4}", self._mask_ssn),
+
+        # 各敏感資料型態對應的遮罩函式
+        self._mask_funcs = {
+            "email": self._mask_email,
+            "credit_card": self._mask_credit_card,
+            "ssn": self._mask_ssn,
+            "phone": self._mask_phone,
         }
+        # 所有模式合併為單一交替正則：一次掃描即可判斷值的型態，
+        # 以 lastgroup 分派遮罩函式（順序由嚴格到寬鬆，避免誤判）
+        self._merged = re.compile(
+            r"(?P<email>[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"
+            r"|(?P<credit_card>\d{4}[-\s]?\d{4}[-\s]?\d{4}[-\s]?\d{4})"
+            r"|(?P<ssn>\d{3}[-\s]?\d{2}[-\s]?\d{4})"
+            r"|(?P<phone>\d{2,4}[-\s]?\d{3,4}[-\s]?\d{3,4})"
+        )
+        self._strip = re.compile(r"[-\s]")
+        self._field_sep = re.compile(r"[_\-\s./]+")
+        # 每個欄位名稱的遮罩決策快取：同一結構的大量資料列
+        # 重複出現相同欄位名，判斷一次後即查表分派
+        self._decision_cache: dict[str, Callable[[str], str] | None] = {}
+
+    def _needs_mask(self, field_lower: str) -> bool:
+        """判斷欄位名稱是否屬於需遮罩欄位
+
+        將欄位名稱依常見分隔符切開後做集合查詢
+        （例如 "work_email" 會因 "email" 而命中）。
+        """
+        if field_lower in self.masked_fields:
+            return True
+        return not self.masked_fields.isdisjoint(self._field_sep.split(field_lower))
     
     def _mask_email(self, value: str) -> str:
         """遮罩電子郵件地址"""
@@ -47,21 +71,21 @@ class DataMasker:
     
     def _mask_phone(self, value: str) -> str:
         """遮罩電話號碼"""
-        digits = re.sub(r"[-\s]", "", value)
+        digits = self._strip.sub("", value)
         if len(digits) >= 4:
             return digits[:2] + "*" * (len(digits) - 4) + digits[-2:]
         return "*" * len(digits)
     
     def _mask_credit_card(self, value: str) -> str:
         """遮罩信用卡號"""
-        digits = re.sub(r"[-\s]", "", value)
+        digits = self._strip.sub("", value)
         if len(digits) >= 4:
             return "*" * (len(digits) - 4) + digits[-4:]
         return "*" * len(digits)
     
     def _mask_ssn(self, value: str) -> str:
         """遮罩社會安全號碼"""
-        return "***-**-" + re.sub(r"[-\s]", "", value)[-4:]
+        return "***-**-" + self._strip.sub("", value)[-4:]
     
     def _mask_generic(self, value: str) -> str:
         """通用遮罩函式"""
@@ -69,64 +93,117 @@ class DataMasker:
             return "*" * len(value)
         return value[0] + "*" * (len(value) - 2) + value[-1]
     
+    def _mask_sensitive(self, str_value: str) -> str:
+        """遮罩已確認屬於敏感欄位的值
+
+        單次掃描判斷值的型態並分派對應的遮罩函式，
+        無法辨識的型態使用通用遮罩。
+        """
+        match = self._merged.fullmatch(str_value)
+        if match is not None:
+            return self._mask_funcs[match.lastgroup](str_value)
+        return self._mask_generic(str_value)
+
     def mask_value(self, field_name: str, value: Any) -> Any:
         """根據欄位名稱遮罩值
-        
+
         Args:
             field_name: 欄位名稱
             value: 原始值
-            
+
         Returns:
             遮罩後的值（如果需要遮罩）或原始值
         """
         if not self.enabled or value is None:
             return value
-        
-        field_lower = field_name.lower()
-        
-        # 檢查是否需要遮罩
-        should_mask = any(
-            masked in field_lower 
-            for masked in self.masked_fields
-        )
-        
-        if not should_mask:
+
+        # 同名欄位的判斷結果只算一次，之後查表即得
+        mask_func = self._field_mask_func(field_name)
+        if mask_func is None:
             return value
-        
-        # 轉換為字串處理
-        str_value = str(value)
-        
-        # 嘗試使用特定模式遮罩
-        for pattern_name, (pattern, mask_func) in self.patterns.items():
-            if pattern_name in field_lower:
-                if re.match(pattern, str_value):
-                    return mask_func(str_value)
-        
-        # 使用通用遮罩
-        return self._mask_generic(str_value)
+        return mask_func(str(value))
+
+    def _field_mask_func(self, field_name: str) -> Callable[[str], str] | None:
+        """查詢（必要時計算）欄位名稱對應的遮罩函式"""
+        try:
+            return self._decision_cache[field_name]
+        except KeyError:
+            mask_func = self._mask_sensitive if self._needs_mask(field_name.lower()) else None
+            self._decision_cache[field_name] = mask_func
+            return mask_func
     
     def mask_dict(self, data: dict[str, Any]) -> dict[str, Any]:
         """遮罩字典中的敏感欄位
-        
+
         Args:
             data: 原始字典資料
-            
+
         Returns:
             遮罩後的字典
         """
-        result = {}
-        for key, value in data.items():
-            if isinstance(value, dict):
-                result[key] = self.mask_dict(value)
-            elif isinstance(value, list):
-                result[key] = [
-                    self.mask_dict(item) if isinstance(item, dict) else self.mask_value(key, item)
-                    for item in value
-                ]
-            else:
-                result[key] = self.mask_value(key, value)
+        if not self.enabled:
+            return data
+
+        # 快速路徑：扁平字典（資料庫查詢結果的常態）
+        # 完全不含需遮罩欄位時直接原樣回傳，省去複製
+        if not any(isinstance(v, (dict, list)) for v in data.values()):
+            if all(self._field_mask_func(k) is None for k in data):
+                return data
+            return {key: self.mask_value(key, value) for key, value in data.items()}
+
+        # 巢狀結構：以顯式堆疊走訪，避免遞迴的 frame 開銷
+        result: dict[str, Any] = {}
+        stack: deque[tuple[dict[str, Any], dict[str, Any]]] = deque([(data, result)])
+        while stack:
+            src, dst = stack.pop()
+            for key, value in src.items():
+                if isinstance(value, dict):
+                    child: dict[str, Any] = {}
+                    dst[key] = child
+                    stack.append((value, child))
+                elif isinstance(value, list):
+                    items: list[Any] = []
+                    for item in value:
+                        if isinstance(item, dict):
+                            child = {}
+                            items.append(child)
+                            stack.append((item, child))
+                        else:
+                            items.append(self.mask_value(key, item))
+                    dst[key] = items
+                else:
+                    dst[key] = self.mask_value(key, value)
         return result
     
+    def mask_columns(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """以欄為單位遮罩同結構的扁平資料列（原地修改）
+
+        資料庫查詢結果的每一列欄位都相同，逐列走 mask_dict 會對每個
+        儲存格重複做欄位判斷與巢狀檢查；這裡改為先依第一列決定需要
+        遮罩的欄位，再對每個欄位各掃一次所有列。
+
+        Args:
+            rows: 欄位相同的扁平字典列表（呼叫端需擁有這些字典，
+                遮罩會直接寫回原物件）
+
+        Returns:
+            遮罩後的列表（與傳入為同一個物件）
+        """
+        if not self.enabled or not rows:
+            return rows
+
+        masked_cols = [
+            (key, mask_func)
+            for key in rows[0]
+            if (mask_func := self._field_mask_func(key)) is not None
+        ]
+        for key, mask_func in masked_cols:
+            for row in rows:
+                value = row[key]
+                if value is not None:
+                    row[key] = mask_func(str(value))
+        return rows
+
     def mask_list(self, data: list[dict[str, Any]]) -> list[dict[str, Any]]:
         """遮罩列表中的所有字典資料
         
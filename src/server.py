@@ -4,16 +4,21 @@ MCP AI Summary Demo - 主要 MCP Server
 實作 MCP 協議，提供 Tools、Resources 和 Prompts
 """
 
+import functools
 import json
 import logging
 import asyncio
+import sys
+import time
 from datetime import datetime
-from typing import Any
+from typing import Any, Awaitable, Callable
 
 from mcp.server.fastmcp import FastMCP
 
 from .config import settings
+from .jsonutil import dumps, dumps_pretty, loads
 from .data_source import data_source
+from .http_client import close_shared_client
 from .prompts import prompt_library
 from .ollama_client import ollama_client, summary_generator
 
@@ -38,59 +43,121 @@ mcp = FastMCP("ai-summary-server")
 # MCP Resources - 提供資料存取
 # ==========================================
 
+# 已序列化資源內容的快取：key -> (到期時間, JSON 字串)
+# 資源資料變動不頻繁，重複讀取可直接回傳編碼好的字串，
+# 同時省下資料庫往返與序列化成本
+_resource_cache: dict[str, tuple[float, str]] = {}
+_RESOURCE_CACHE_TTL = 30.0
+
+
+async def _cached_resource(
+    key: str,
+    producer: Callable[[], Awaitable[str]],
+    ttl: float = _RESOURCE_CACHE_TTL
+) -> str:
+    """回傳快取的資源 JSON 字串，逾期時以 producer 重新產生"""
+    hit = _resource_cache.get(key)
+    now = time.monotonic()
+    if hit is not None and hit[0] > now:
+        return hit[1]
+    text = await producer()
+    _resource_cache[key] = (now + ttl, text)
+    return text
+
+
 @mcp.resource("data://employees")
 async def get_employees_resource() -> str:
     """
     員工資料資源
-    
+
     提供資料庫中所有員工的資訊（敏感欄位已遮罩）
     """
-    employees = await data_source.query_database("employees")
-    return json.dumps(employees, ensure_ascii=False, indent=2)
+    async def produce() -> str:
+        return dumps(await data_source.query_database("employees"))
+
+    return await _cached_resource("data://employees", produce)
 
 
 @mcp.resource("data://projects")
 async def get_projects_resource() -> str:
     """
     專案資料資源
-    
+
     提供所有專案的資訊
     """
-    projects = await data_source.query_database("projects")
-    return json.dumps(projects, ensure_ascii=False, indent=2)
+    async def produce() -> str:
+        return dumps(await data_source.query_database("projects"))
+
+    return await _cached_resource("data://projects", produce)
 
 
 @mcp.resource("schema://employees")
 async def get_employees_schema() -> str:
     """
     員工資料表結構
-    
+
     描述 employees 資料表的欄位定義
     """
-    schema = await data_source.get_table_schema("employees")
-    return json.dumps(schema, ensure_ascii=False, indent=2)
+    async def produce() -> str:
+        return dumps(await data_source.get_table_schema("employees"))
+
+    # 資料表結構在執行期間不會改變
+    return await _cached_resource("schema://employees", produce, ttl=float("inf"))
 
 
 @mcp.resource("schema://projects")
 async def get_projects_schema() -> str:
     """
     專案資料表結構
-    
+
     描述 projects 資料表的欄位定義
     """
-    schema = await data_source.get_table_schema("projects")
-    return json.dumps(schema, ensure_ascii=False, indent=2)
+    async def produce() -> str:
+        return dumps(await data_source.get_table_schema("projects"))
+
+    # 資料表結構在執行期間不會改變
+    return await _cached_resource("schema://projects", produce, ttl=float("inf"))
 
 
 @mcp.resource("templates://list")
 async def get_prompt_templates() -> str:
     """
     Prompt 模板列表
-    
+
     列出所有可用的 prompt 模板及其描述
     """
-    templates = prompt_library.list_templates()
-    return json.dumps(templates, ensure_ascii=False, indent=2)
+    async def produce() -> str:
+        return dumps(prompt_library.list_templates())
+
+    return await _cached_resource("templates://list", produce)
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_json_object(text: str) -> tuple[tuple[str, Any], ...]:
+    """解析小型 JSON 物件字串並快取結果
+
+    filters、extra_vars 這類參數在重複的提問中常是同一小撮字串，
+    相同輸入只解析一次。回傳不可變的項目元組，
+    由呼叫端重建字典，避免快取的物件被呼叫端改動。
+    """
+    parsed = loads(text)
+    if not isinstance(parsed, dict):
+        raise ValueError(f"需要 JSON 物件，收到: {type(parsed).__name__}")
+    return tuple(sorted(parsed.items()))
+
+
+# 今日日期字串的快取：日期一天只變一次，不必每次呼叫都走 strftime；
+# 穩定的字串也讓含日期的 prompt 前綴整天保持一致，利於 Ollama KV 快取
+_date_cache: tuple[float, str] = (0.0, "")
+
+
+def _today_str() -> str:
+    """回傳今日日期字串（YYYY-MM-DD），每分鐘最多重新計算一次"""
+    global _date_cache
+    now = time.time()
+    if now - _date_cache[0] > 60.0:
+        _date_cache = (now, datetime.now().strftime("%Y-%m-%d"))
+    return _date_cache[1]
 
 
 # ==========================================
@@ -100,7 +167,8 @@ async def get_prompt_templates() -> str:
 @mcp.tool()
 async def query_employees(
     department: str | None = None,
-    limit: int = 50
+    limit: int = 50,
+    pretty: bool = False
 ) -> str:
     """查詢員工資料
     
@@ -108,30 +176,41 @@ async def query_employees(
     敏感資料（email、電話等）會自動遮罩。
     
     Args:
-        department: 部門名稱（可選），例如 "研發部"、"人資部"
+        department: 部門名稱（可選），例如 "研發部"；
+            以逗號分隔多個部門（如 "研發部,人資部"）可一次查詢
         limit: 最大回傳筆數，預設 50
+        pretty: 是否輸出縮排格式（預設緊湊，供 LLM 或程式使用）
     """
-    conditions = {"department": department} if department else None
+    conditions = None
+    if department:
+        # 逗號分隔的多個部門合併為單一 IN 查詢，只需一次資料庫往返
+        departments = [d.strip() for d in department.split(",") if d.strip()]
+        if len(departments) > 1:
+            conditions = {"department": departments}
+        elif departments:
+            conditions = {"department": departments[0]}
     employees = await data_source.query_database("employees", conditions, limit)
-    return json.dumps(employees, ensure_ascii=False, indent=2)
+    return dumps_pretty(employees) if pretty else dumps(employees)
 
 
 @mcp.tool()
 async def query_projects(
     status: str | None = None,
-    limit: int = 50
+    limit: int = 50,
+    pretty: bool = False
 ) -> str:
     """查詢專案資料
-    
+
     從資料庫查詢專案資訊，可依狀態篩選。
-    
+
     Args:
         status: 專案狀態（可選），例如 "進行中"、"已完成"、"規劃中"
         limit: 最大回傳筆數
+        pretty: 是否輸出縮排格式（預設緊湊，供 LLM 或程式使用）
     """
     conditions = {"status": status} if status else None
     projects = await data_source.query_database("projects", conditions, limit)
-    return json.dumps(projects, ensure_ascii=False, indent=2)
+    return dumps_pretty(projects) if pretty else dumps(projects)
 
 
 @mcp.tool()
@@ -148,13 +227,18 @@ async def fetch_api_data(
         endpoint: API 端點，例如 "users", "posts/1", "users/1/posts"
         limit: 限制回傳筆數（僅適用於列表資料）
     """
+    # 不需截斷也不需遮罩時，回應原樣轉交即可，
+    # 省下一整趟解析與重新序列化；遮罩啟用時必須解析才能處理欄位
+    if limit is None and not settings.enable_data_masking:
+        return await data_source.fetch_from_api_raw(endpoint)
+
     data = await data_source.fetch_from_api(endpoint)
     
     # 如果是列表且有限制
     if isinstance(data, list) and limit:
         data = data[:limit]
     
-    return json.dumps(data, ensure_ascii=False, indent=2)
+    return dumps(data)
 
 
 @mcp.tool()
@@ -181,31 +265,37 @@ async def generate_summary(
         extra_vars: 額外變數的 JSON 字串（依模板需求提供）
     """
     try:
+        # 預熱 Ollama 連線（與資料解析、prompt 組裝重疊進行）
+        warmup = asyncio.create_task(ollama_client.check_health())
+
         # 解析資料
-        parsed_data = json.loads(data)
+        parsed_data = loads(data)
         
         # 準備變數
         variables = {"data": parsed_data}
         
-        # 解析額外變數
+        # 解析額外變數（重複出現的相同字串直接取快取結果）
         if extra_vars:
-            extra = json.loads(extra_vars)
-            variables.update(extra)
+            variables.update(_parse_json_object(extra_vars))
         
         # 針對特定模板添加預設變數
         if template_name == "project_status":
-            variables.setdefault("current_date", datetime.now().strftime("%Y-%m-%d"))
+            variables.setdefault("current_date", _today_str())
             variables.setdefault("projects", parsed_data)
         elif template_name == "employee_analysis":
             variables.setdefault("employees", parsed_data)
             variables.setdefault("department", "全公司")
         
-        # 渲染 prompt
-        prompt = prompt_library.render(template_name, **variables)
-        
-        # 生成摘要
+        # 渲染 prompt：純 CPU 的字串組裝移到工作執行緒，
+        # 大型資料的渲染不會卡住事件迴圈上其他併發的工具呼叫
+        prompt = await asyncio.to_thread(
+            prompt_library.render, template_name, **variables
+        )
+
+        # 生成摘要（確保預熱已完成，連線可直接重用）
+        await warmup
         summary = await summary_generator.generate_summary(prompt)
-        
+
         return summary
         
     except json.JSONDecodeError as e:
@@ -217,33 +307,40 @@ async def generate_summary(
         return f"錯誤：生成摘要失敗，請確認 Ollama 服務是否正常運作。詳細：{e}"
 
 
+# 服務不可用時的回應內容完全由設定決定，啟動時序列化一次即可重用
+_OLLAMA_DOWN_RESPONSE = dumps({
+    "status": "error",
+    "message": f"無法連接到 Ollama 服務（{settings.ollama_base_url}）",
+    "suggestion": "請確認 Ollama 已啟動，可執行 'ollama serve' 啟動服務"
+})
+
+
 @mcp.tool()
 async def check_ollama_status() -> str:
     """檢查 Ollama 服務狀態
-    
+
     檢查本地 Ollama 服務是否正常運作，並列出可用的模型。
     """
-    is_healthy = await ollama_client.check_health()
-    
+    # 兩個請求互相獨立，並行送出省下一次串行往返
+    is_healthy, models = await asyncio.gather(
+        ollama_client.check_health(),
+        ollama_client.list_models()
+    )
+
     if not is_healthy:
-        return json.dumps({
-            "status": "error",
-            "message": f"無法連接到 Ollama 服務（{settings.ollama_base_url}）",
-            "suggestion": "請確認 Ollama 已啟動，可執行 'ollama serve' 啟動服務"
-        }, ensure_ascii=False, indent=2)
-    
-    models = await ollama_client.list_models()
+        return _OLLAMA_DOWN_RESPONSE
+
     current_model = settings.ollama_model
     model_available = current_model in models
     
-    return json.dumps({
+    return dumps({
         "status": "ok",
         "base_url": settings.ollama_base_url,
         "configured_model": current_model,
         "model_available": model_available,
         "available_models": models,
         "suggestion": None if model_available else f"請執行 'ollama pull {current_model}' 下載模型"
-    }, ensure_ascii=False, indent=2)
+    })
 
 
 @mcp.tool()
@@ -252,8 +349,11 @@ async def list_prompt_templates() -> str:
     
     顯示所有預定義的 prompt 模板、描述及所需變數。
     """
-    templates = prompt_library.list_templates()
-    return json.dumps(templates, ensure_ascii=False, indent=2)
+    async def produce() -> str:
+        return dumps(prompt_library.list_templates())
+
+    # 與 templates://list 資源共用同一份快取
+    return await _cached_resource("templates://list", produce)
 
 
 @mcp.tool()
@@ -272,26 +372,31 @@ async def answer_question(
         filters: 過濾條件的 JSON 字串（可選）
     """
     try:
-        # 取得資料
-        conditions = json.loads(filters) if filters else None
-        
+        # 預熱 Ollama 連線（與資料查詢、prompt 組裝重疊進行）
+        warmup = asyncio.create_task(ollama_client.check_health())
+
+        # 取得資料（重複出現的相同過濾字串直接取快取結果）
+        conditions = dict(_parse_json_object(filters)) if filters else None
+
         if data_source_type == "employees":
             data = await data_source.query_database("employees", conditions)
         elif data_source_type == "projects":
             data = await data_source.query_database("projects", conditions)
         else:
             return f"錯誤：不支援的資料來源類型 '{data_source_type}'"
-        
-        # 使用問答模板
-        prompt = prompt_library.render(
+
+        # 使用問答模板（渲染移到工作執行緒，不阻塞事件迴圈）
+        prompt = await asyncio.to_thread(
+            prompt_library.render,
             "qa_with_context",
             context_data=data,
             question=question
         )
-        
-        # 生成回答
+
+        # 生成回答（確保預熱已完成，連線可直接重用）
+        await warmup
         answer = await summary_generator.generate_summary(prompt)
-        
+
         return answer
         
     except Exception as e:
@@ -333,7 +438,7 @@ async def summarize_projects(status: str | None = None) -> str:
     return prompt_library.render(
         "project_status",
         projects=projects,
-        current_date=datetime.now().strftime("%Y-%m-%d")
+        current_date=_today_str()
     )
 
 
@@ -344,17 +449,52 @@ async def summarize_projects(status: str | None = None) -> str:
 async def init_server():
     """初始化伺服器"""
     await data_source.init_database()
+
+    # 預先序列化啟動後即不變的資源內容，
+    # 讓第一次讀取也只是回傳現成字串
+    _resource_cache["schema://employees"] = (
+        float("inf"),
+        dumps(await data_source.get_table_schema("employees"))
+    )
+    _resource_cache["schema://projects"] = (
+        float("inf"),
+        dumps(await data_source.get_table_schema("projects"))
+    )
+    _resource_cache["templates://list"] = (
+        time.monotonic() + _RESOURCE_CACHE_TTL,
+        dumps(prompt_library.list_templates())
+    )
+
     logger.info("MCP AI Summary Server 初始化完成")
 
 
+async def shutdown_server():
+    """關閉伺服器時釋放共用資源"""
+    await data_source.close()
+    await close_shared_client()
+
+
 def main():
     """主程式進入點"""
+    # uvloop（選用，pip install .[perf]）以 libuv 取代預設事件迴圈，
+    # 對 I/O 密集的併發工具呼叫可提升吞吐；Windows 不支援
+    if sys.platform != "win32":
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            pass
+
     # 執行初始化
     asyncio.run(init_server())
-    
+
     # 啟動 MCP Server
     # 使用 stdio transport 與 MCP 客戶端通訊
-    mcp.run(transport='stdio')
+    try:
+        mcp.run(transport='stdio')
+    finally:
+        # 釋放共用的資料庫連線與 HTTP 連線池
+        asyncio.run(shutdown_server())
 
 
 if __name__ == "__main__":